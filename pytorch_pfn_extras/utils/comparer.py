@@ -1,4 +1,3 @@
-import collections
 import concurrent.futures
 import pathlib
 import re
@@ -11,8 +10,10 @@ from typing import (
     Iterable,
     List,
     Mapping,
+    MutableMapping,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Type,
     Union,
@@ -28,6 +29,16 @@ from pytorch_pfn_extras.training import trigger as trigger_module
 
 _thread_local = threading.local()
 _intermediate_prefix = "intermedaite:"
+# Tensors up to this many elements are concatenated before being checked
+_concat_max_numel = 4096
+
+
+class _IterationPlusOneProxy(manager_module._ManagerProxy):
+    @property
+    def iteration(self) -> int:
+        # `Comparer._compare_targets` will be called
+        # before `iteration` is incremented.
+        return self._manager.iteration + 1
 
 
 class _ComparableHandler(_handler_module.BaseHandler):
@@ -95,17 +106,15 @@ class _ComparableHandler(_handler_module.BaseHandler):
         batch: Any,
         outputs: Any,
     ) -> None:
-        class _ManagerProxy(manager_module._ManagerProxy):
-            @property
-            def iteration(self) -> int:
-                # `Comparer._compare_targets` will be called
-                # before `iteration` is incremented.
-                return self._manager.iteration + 1
-
-        manager = _ManagerProxy(trainer.manager)
+        manager = _IterationPlusOneProxy(trainer.manager)
         self._handler.train_post_step(trainer, batch_idx, batch, outputs)
         if self._trigger is None or self._trigger(manager):
             self._compare(trainer, batch_idx, outputs)
+        else:
+            # Do not keep the intermediate values of skipped iterations
+            # alive until the same batch index comes in the next epoch
+            self._intermediate_values.pop(batch_idx, None)
+            self._intermediate_counts.pop(batch_idx, None)
 
     def eval_setup(
         self, evaluator: _evaluator.Evaluator, loader: Iterable[Any]
@@ -181,6 +190,127 @@ _CompareFn = Callable[[str, str, str, Any, Any], None]
 _Engine = Union[_trainer.Trainer, _evaluator.Evaluator]
 
 
+def _is_batchable(val1: Any, val2: Any) -> bool:
+    # Dense floating point tensors whose metadata already agree can be
+    # checked with `torch.allclose` instead of `assert_close`
+    return (
+        isinstance(val1, torch.Tensor)
+        and isinstance(val2, torch.Tensor)
+        and val1.layout == torch.strided
+        and val2.layout == torch.strided
+        and val1.dtype in (torch.float32, torch.float64)
+        and val1.dtype == val2.dtype
+        and val1.device == val2.device
+        and val1.shape == val2.shape
+    )
+
+
+def _to_cpu(value: torch.Tensor) -> torch.Tensor:
+    # Detach first so that the copy is not recorded by autograd
+    if value.requires_grad:
+        value = value.detach()
+    return value.cpu()
+
+
+class _DefaultComparer:
+    def __init__(self, rtol: float, atol: float, equal_nan: bool) -> None:
+        self._rtol = rtol
+        self._atol = atol
+        self._equal_nan = equal_nan
+
+    def __call__(
+        self, backend1: str, backend2: str, name: str, val1: Any, val2: Any
+    ) -> None:
+        # Tensors on the same device are checked where they live, so
+        # only the result of the check has to be transferred
+        if _is_batchable(val1, val2) and self._allclose(val1, val2):
+            return
+        if isinstance(val1, torch.Tensor):
+            val1 = _to_cpu(val1)
+        if isinstance(val2, torch.Tensor):
+            val2 = _to_cpu(val2)
+
+        # Let `assert_close` report the mismatch in detail
+        torch.testing.assert_close(
+            val1,
+            val2,
+            rtol=self._rtol,
+            atol=self._atol,
+            equal_nan=self._equal_nan,
+        )
+
+    def _allclose(self, val1: torch.Tensor, val2: torch.Tensor) -> bool:
+        return torch.allclose(
+            val1,
+            val2,
+            rtol=self._rtol,
+            atol=self._atol,
+            equal_nan=self._equal_nan,
+        )
+
+    def _isclose_all(
+        self, val1: torch.Tensor, val2: torch.Tensor
+    ) -> torch.Tensor:
+        # Same as `_allclose` but the result stays on the device
+        return torch.isclose(
+            val1,
+            val2,
+            rtol=self._rtol,
+            atol=self._atol,
+            equal_nan=self._equal_nan,
+        ).all()
+
+    def _compare_pair(
+        self,
+        baseline: str,
+        backend: str,
+        keys: Sequence[str],
+        target1: Dict[str, Any],
+        target2: Dict[str, Any],
+    ) -> str:
+        """Compares all the values of two targets.
+
+        Batchable tensors are checked without synchronizing for each of
+        them. Small ones are flattened and concatenated per dtype and
+        device so that a single check covers them. The results are
+        reduced on their device and only a single boolean per device is
+        transferred. The remaining values, or every value if that
+        check fails, are compared one by one so that the error message
+        names the mismatching values.
+        """
+        results: Dict[torch.device, List[torch.Tensor]] = {}
+        groups: Dict[
+            Tuple[torch.dtype, torch.device],
+            Tuple[List[torch.Tensor], List[torch.Tensor]],
+        ] = {}
+        remaining = []
+        for key in keys:
+            val1, val2 = target1[key], target2[key]
+            if not _is_batchable(val1, val2):
+                remaining.append(key)
+            elif val1.numel() <= _concat_max_numel:
+                vals1, vals2 = groups.setdefault(
+                    (val1.dtype, val1.device), ([], [])
+                )
+                vals1.append(val1.detach().reshape(-1))
+                vals2.append(val2.detach().reshape(-1))
+            else:
+                results.setdefault(val1.device, []).append(
+                    self._isclose_all(val1, val2)
+                )
+        for (_, device), (vals1, vals2) in groups.items():
+            results.setdefault(device, []).append(
+                self._isclose_all(torch.cat(vals1), torch.cat(vals2))
+            )
+        for device_results in results.values():
+            if not torch.stack(device_results).all().item():
+                remaining = list(keys)
+                break
+        return _compare_each(
+            self, baseline, backend, remaining, target1, target2
+        )
+
+
 def get_default_comparer(
     rtol: float = 1e-04,
     atol: float = 0,
@@ -189,61 +319,171 @@ def get_default_comparer(
     """Creates default comparer function.
 
     The created function will compare the outputs by using
-    `torch.testing.assert_allclose` with specified options.
+    `torch.testing.assert_close` with specified options.
 
     Args:
         rtol (float): Relative tolerance.
         atol (float): Absolute tolerance.
         equal_nan (bool): If ``True``, NaNs will be ignored.
     """
+    return _DefaultComparer(rtol, atol, equal_nan)
 
-    def compare_fn(
-        backend1: str, backend2: str, name: str, val1: Any, val2: Any
-    ) -> None:
-        # TODO select the device where
-        # the tensors will be compared?
-        if isinstance(val1, torch.Tensor):
-            val1 = val1.cpu().detach()
-        if isinstance(val2, torch.Tensor):
-            val2 = val2.cpu().detach()
 
-        torch.testing.assert_close(
-            val1, val2, rtol=rtol, atol=atol, equal_nan=equal_nan
-        )
-
-    return compare_fn
+_default_comparer = get_default_comparer()
 
 
-_default_comparer = get_default_comparer()
+def _to_host(
+    targets: Dict[str, Any],
+    host_buffers: Optional[Dict[Tuple[str, str], torch.Tensor]] = None,
+) -> Dict[str, Any]:
+    # Enqueue all the device-to-host copies first and synchronize once,
+    # instead of blocking on a `.cpu()` call for every single tensor.
+    # Values that are on the same device in every target stay there.
+    # When `host_buffers` is given, the pinned buffer of the same engine
+    # and key is reused across comparisons while the values fit in it,
+    # and replaced by a larger one otherwise.
+    key_devices: Dict[str, Set[torch.device]] = {}
+    for target in targets.values():
+        for key, value in target.items():
+            if isinstance(value, torch.Tensor):
+                key_devices.setdefault(key, set()).add(value.device)
+
+    devices = set()
+    host_targets = {}
+    for name, target in targets.items():
+        host_target = {}
+        for key, value in target.items():
+            if (
+                isinstance(value, torch.Tensor)
+                and value.is_cuda
+                and value.layout == torch.strided
+                and len(key_devices[key]) > 1
+            ):
+                buf = None
+                if host_buffers is not None:
+                    buf = host_buffers.get((name, key))
+                if (
+                    buf is None
+                    or buf.dtype != value.dtype
+                    or buf.numel() < value.numel()
+                ):
+                    buf = torch.empty(
+                        value.numel(), dtype=value.dtype, pin_memory=True
+                    )
+                    if host_buffers is not None:
+                        host_buffers[(name, key)] = buf
+                host_value = buf[: value.numel()].view(value.shape)
+                host_value.copy_(value.detach(), non_blocking=True)
+                devices.add(value.device)
+                value = host_value
+            host_target[key] = value
+        host_targets[name] = host_target
+    for device in devices:
+        torch.cuda.synchronize(device)
+    return host_targets
+
+
+def _compare_each(
+    compare_fn: _CompareFn,
+    baseline: str,
+    backend: str,
+    keys: Sequence[str],
+    target1: Dict[str, Any],
+    target2: Dict[str, Any],
+) -> str:
+    err_msg = ""
+    for val_name in keys:
+        try:
+            compare_fn(
+                baseline,
+                backend,
+                val_name,
+                target1[val_name],
+                target2[val_name],
+            )
+        except AssertionError as e:
+            err_msg += (
+                f"Comparing '{baseline}' and '{backend}' in '{val_name}'\n"
+                f"{str(e)}\n"
+            )
+    return err_msg
 
 
 def _compare_targets(
     compare_fn: _CompareFn,
     targets: Dict[str, Any],
-    baseline: Optional[str],
+    baseline: str,
+    backends: Sequence[str],
     batch_idx: int,
+    host_buffers: Optional[Dict[Tuple[str, str], torch.Tensor]] = None,
 ) -> None:
-    names = list(targets.keys())
-    if baseline is None:
-        baseline = names[0]
+    # Custom compare functions receive the values as the engines
+    # produced them, one key at a time
+    if isinstance(compare_fn, _DefaultComparer):
+        targets = _to_host(targets, host_buffers)
     keys = sorted(targets[baseline].keys())
 
     err_msg = ""
-    for backend in set(names) - set([baseline]):
-        for val_name in keys:
-            out1 = targets[baseline][val_name]
-            out2 = targets[backend][val_name]
-            try:
-                compare_fn(baseline, backend, val_name, out1, out2)
-            except AssertionError as e:
-                err_msg += (
-                    f"Comparing '{baseline}' and '{backend}' in '{val_name}'\n"
-                    f"{str(e)}\n"
-                )
+    for backend in backends:
+        target1, target2 = targets[baseline], targets[backend]
+        if isinstance(compare_fn, _DefaultComparer):
+            err_msg += compare_fn._compare_pair(
+                baseline, backend, keys, target1, target2
+            )
+        else:
+            err_msg += _compare_each(
+                compare_fn, baseline, backend, keys, target1, target2
+            )
     if err_msg:
         raise AssertionError(f"Batch: {batch_idx}\n" + str(err_msg))
 
 
+def _key_matcher(pattern: str) -> Callable[[str], bool]:
+    # Patterns without any regex syntax, optionally followed by ".*",
+    # match exactly the keys starting with them
+    prefix = pattern[:-2] if pattern.endswith(".*") else pattern
+    if re.escape(prefix) == prefix:
+        return lambda key: key.startswith(prefix)
+    regex = re.compile(pattern)
+    return lambda key: regex.match(key) is not None
+
+
+class _ModelTensors:
+    def __init__(self, model: torch.nn.Module, keys: Iterable[str]) -> None:
+        # Parameters keep their identity while training, so they are
+        # looked up once. Buffers are plain attributes that modules or
+        # runtimes may reassign, so they are looked up on every call.
+        # Any other entry falls back to building the state dict.
+        self._model = model
+        self._keys = list(keys)
+        self._params: Dict[str, torch.Tensor] = {}
+        self._buffers: Set[str] = set()
+        self._needs_state_dict = False
+        for key in self._keys:
+            try:
+                self._params[key] = model.get_parameter(key)
+                continue
+            except AttributeError:
+                pass
+            try:
+                model.get_buffer(key)
+                self._buffers.add(key)
+            except AttributeError:
+                self._needs_state_dict = True
+
+    def get(self) -> Dict[str, Any]:
+        sdict = self._model.state_dict() if self._needs_state_dict else {}
+        tensors: Dict[str, Any] = {}
+        for key in self._keys:
+            if key in self._params:
+                tensors[key] = self._params[key].detach()
+            elif key in self._buffers:
+                tensors[key] = self._model.get_buffer(key).detach()
+            else:
+                tensors[key] = sdict[key]
+        return tensors
+
+
 class _ComparerBase:
     def __init__(
         self,
@@ -312,14 +552,14 @@ class _ComparerBase:
         # n_iters is the number of iterations that we wait for
         # compare
         self.n_iters = n_iters
-        self._iters = {k: 0 for k in self.engines.keys()}
+        self._iters = {k: 0 for k in self.engines}
         # We need to use a thread pool because is not easy at all to sync
         # the run method of different engines to compare every n iterations
-        for name in self.engines.keys():
+        for name in self.engines:
             if name not in loaders:
                 raise KeyError(f"'{name}' is not in `loaders`")
         with concurrent.futures.ThreadPoolExecutor(
-            max_workers=len(self.engines)
+            max_workers=len(self.engines), thread_name_prefix="Comparer"
         ) as executor:
             futures = []
             for name, engine in self.engines.items():
@@ -350,10 +590,15 @@ class _ComparerBase:
             # Save the outputs of this iteration
             with self.report_lock:
                 self.targets[name] = target
-                if len(self.targets.keys()) == len(self.engines.keys()):
+                if len(self.targets) == len(self.engines):
                     # all outputs have been filled, lets compare and reset
+                    names = list(self.targets.keys())
                     _compare_targets(
-                        self.compare_fn, self.targets, None, batch_idx
+                        self.compare_fn,
+                        self.targets,
+                        names[0],
+                        names[1:],
+                        batch_idx,
                     )
                     self.targets = {}
                 self._assert_incompatible_trigger(not self._finalized)
@@ -455,17 +700,29 @@ class ModelComparer(_ComparerBase):
             engines, compare_fn=compare_fn, concurrency=concurrency
         )
         self.to_compare_keys = to_compare_keys
+        self._to_compare_matchers = (
+            None
+            if to_compare_keys is None
+            else [_key_matcher(tc_k) for tc_k in to_compare_keys]
+        )
         self._preprocessed_keys: Optional[List[str]] = None
+        # Keyed weakly so that handlers replaced by the user are released
+        self._params: MutableMapping[
+            _handler_module.BaseHandler, _ModelTensors
+        ] = weakref.WeakKeyDictionary()
 
     def _preprocess_keys(self, sdict: Dict[str, Any]) -> None:
         if self.to_compare_keys is None:
             self._preprocessed_keys = list(sdict.keys())
         else:
+            assert self._to_compare_matchers is not None
             self._preprocessed_keys = []
-            for tc_k in self.to_compare_keys:
+            for tc_k, match in zip(
+                self.to_compare_keys, self._to_compare_matchers
+            ):
                 matched = False
                 for sd_k in sdict.keys():
-                    if re.match(tc_k, sd_k) is not None:
+                    if match(sd_k):
                         self._preprocessed_keys.append(sd_k)
                         matched = True
                 if not matched:
@@ -480,11 +737,16 @@ class ModelComparer(_ComparerBase):
         batch_idx: int,
         outputs: Any,
     ) -> Dict[str, Any]:
-        sdict = engine.models["main"].state_dict()
-        if self._preprocessed_keys is None:
-            self._preprocess_keys(sdict)
-        assert self._preprocessed_keys is not None
-        return {key: sdict[key] for key in self._preprocessed_keys}
+        params = self._params.get(handle)
+        if params is None:
+            # Avoid building a state dict every iteration
+            model = engine.models["main"]
+            if self._preprocessed_keys is None:
+                self._preprocess_keys(model.state_dict())
+            assert self._preprocessed_keys is not None
+            params = _ModelTensors(model, self._preprocessed_keys)
+            self._params[handle] = params
+        return params.get()
 
 
 # New comparer interface
@@ -492,28 +754,26 @@ class ModelComparer(_ComparerBase):
 
 def _filter(
     keys: Union[bool, str, Sequence[str]],
-    get_dict: Callable[[], Dict[str, Any]],
-) -> Dict[str, Any]:
+    names: Iterable[str],
+) -> List[str]:
     if keys is False:
-        return {}
+        return []
     if keys is True:
-        return get_dict()
+        return list(names)
 
     if isinstance(keys, str):
         keys = (keys,)
     if isinstance(keys, (tuple, list)):
-        if len(keys) == 0:
-            return {}
-        sdict = get_dict()
-        ret = {}
+        ret: Dict[str, None] = {}
         for tc_k in keys:
-            for sd_k in sdict.keys():
-                if re.match(tc_k, sd_k) is not None:
-                    ret[sd_k] = sdict[sd_k]
+            match = _key_matcher(tc_k)
+            for sd_k in names:
+                if match(sd_k):
+                    ret[sd_k] = None
                     break
             else:
                 raise ValueError(f"didnt find a match for {tc_k} in the model")
-        return ret
+        return list(ret)
 
     raise ValueError(f"Unsupported type: {type(keys)}")
 
@@ -561,19 +821,33 @@ class Comparer:
         self._engine_type: Optional[Type[_Engine]] = None
         self._engines: Dict[
             str, Tuple[Union[_Engine, _LoadDumpsEngine], Any, Any]
-        ] = collections.OrderedDict()
+        ] = {}
         self._compare_fn = compare_fn
         self._targets: Dict[str, Dict[str, Any]] = {}
         self._output_keys = outputs
         self._param_keys = params
+        # With outputs and params disabled, only intermediate values are
+        # compared, but engines still rendezvous every compared step
+        self._intermediates_only = outputs is False and params is False
+        # Resolved keys of the outputs and model tensors to compare
+        self._output_names: Dict[_ComparableHandler, List[str]] = {}
+        self._params: Dict[_ComparableHandler, _ModelTensors] = {}
         self._baseline = baseline
+        # Engine names resolved when the comparison starts
+        self._reference: Optional[str] = None
+        self._backends: Tuple[str, ...] = ()
+        # Pinned host buffers for the values copied from CUDA devices,
+        # kept apart for the trainer and the evaluator steps
+        self._host_buffers: Dict[str, Dict[Tuple[str, str], torch.Tensor]] = {}
         self._finalized = False
         self._concurrency = concurrency  # Upper limit of semaphore size
         # Sempaphore for training step execution
         self._semaphore: Optional[threading.Semaphore] = None
-        # Synchronizes iteration timing
-        self._barrier: Optional[threading.Barrier] = None
         self._report_lock = threading.Lock()  # Locks `Comparer._get_target`
+        # Synchronizes iteration timing; the engine that arrives last
+        # compares the targets and sets the event of the generation
+        self._generation_done = threading.Event()
+        self._broken = False
         self._count = 0
 
         if trigger is None:
@@ -589,18 +863,42 @@ class Comparer:
         batch_idx: int,
         outputs: Dict[str, Any],
     ) -> Dict[str, Any]:
-        targets = {}
-        outputs = _filter(self._output_keys, lambda: outputs)
-        targets.update(
-            {
-                k if k.startswith(_intermediate_prefix) else "output:" + k: v
-                for k, v in outputs.items()
-            }
-        )
-        targets.update(handler._intermediate_values.pop(batch_idx))
-
-        params = _filter(self._param_keys, engine.models["main"].state_dict)
-        targets.update({"param:" + k: v for k, v in params.items()})
+        intermediate_values = handler._intermediate_values.pop(batch_idx)
+        handler._intermediate_counts.pop(batch_idx, None)
+        if self._intermediates_only:
+            return intermediate_values
+
+        targets: Dict[str, Any] = {}
+        output_keys: Iterable[str]
+        if self._output_keys is True:
+            # The outputs may have different keys in each iteration
+            output_keys = outputs.keys()
+        else:
+            # Only the matching of the patterns is done once per handler
+            names = self._output_names.get(handler)
+            if names is None:
+                names = _filter(self._output_keys, outputs.keys())
+                self._output_names[handler] = names
+            for k in names:
+                if k not in outputs:
+                    raise ValueError(f"didnt find {k} in the outputs")
+            output_keys = names
+        for k in output_keys:
+            if k.startswith(_intermediate_prefix):
+                targets[k] = outputs[k]
+            else:
+                targets["output:" + k] = outputs[k]
+        targets.update(intermediate_values)
+
+        params = self._params.get(handler)
+        if params is None:
+            # Avoid building a state dict every iteration
+            model = engine.models["main"]
+            keys = _filter(self._param_keys, model.state_dict().keys())
+            params = _ModelTensors(model, keys)
+            self._params[handler] = params
+        for k, v in params.get().items():
+            targets["param:" + k] = v
         return targets
 
     def _assert_incompatible_trigger(self, condition: bool) -> None:
@@ -626,27 +924,61 @@ class Comparer:
         batch_idx: int,
         target: Dict[str, Any],
     ) -> None:
+        if not self._backends:
+            # A single engine has nothing to be compared with, so there is
+            # no need to synchronize either
+            return
+
+        targets: Optional[Dict[str, Dict[str, Any]]] = None
         # Save the outputs of this iteration
         with self._report_lock:
+            if self._broken:
+                raise threading.BrokenBarrierError
             self._targets[name] = target
-            if len(self._targets.keys()) == len(self._engines.keys()):
-                # all outputs have been filled, lets compare and reset
-                _compare_targets(
-                    self._compare_fn, self._targets, self._baseline, batch_idx
-                )
-                self._targets = {}
-                self._count += 1
+            generation_done = self._generation_done
+            if len(self._targets) == len(self._engines):
+                # all outputs have been filled, lets take them and reset
+                targets, self._targets = self._targets, {}
             self._assert_incompatible_trigger(not self._finalized)
 
+        if targets is not None:
+            # The other engines keep waiting for this generation to end,
+            # so the comparison does not need to hold the lock
+            assert self._reference is not None
+            # Trainer and evaluator steps usually report values of
+            # different sizes, so they do not share the host buffers
+            host_buffers = self._host_buffers.setdefault(
+                "eval" if isinstance(engine, _evaluator.Evaluator) else "train",
+                {},
+            )
+            _compare_targets(
+                self._compare_fn,
+                targets,
+                self._reference,
+                self._backends,
+                batch_idx,
+                host_buffers,
+            )
+            with self._report_lock:
+                self._count += 1
+                self._generation_done = threading.Event()
+            generation_done.set()
+
         # Excplicitly synchronize
         assert self._semaphore is not None
-        assert self._barrier is not None
         self._semaphore.release()
         try:
-            self._barrier.wait()
+            generation_done.wait()
+            if self._broken:
+                raise threading.BrokenBarrierError
         finally:
             self._semaphore.acquire()
 
+    def _abort(self) -> None:
+        with self._report_lock:
+            self._broken = True
+            self._generation_done.set()
+
     def add_engine(
         self,
         name: str,
@@ -674,7 +1006,7 @@ class Comparer:
         elif type_engine != self._engine_type:
             raise ValueError("All the engines must be of the same type")
 
-        if name in self._engines.keys():
+        if name in self._engines:
             raise ValueError(f"Engine named {name} already registered")
 
         _overwrite_handler(
@@ -737,12 +1069,19 @@ class Comparer:
         engine.run(*args, **kwargs)
         self._engines.pop(name)
 
+        # The handlers of a dump are not used again, so the keys and the
+        # model references resolved for them are released
+        for e in (engine, getattr(engine, "evaluator", None)):
+            handler = getattr(e, "handler", None)
+            if isinstance(handler, _ComparableHandler):
+                self._output_names.pop(handler, None)
+                self._params.pop(handler, None)
+
         assert isinstance(engine.handler, _ComparableHandler)
         engine.handler = engine.handler._handler
 
     def _run_engine(self, engine: _Engine, args: Any, kwargs: Any) -> None:
         assert self._semaphore is not None
-        assert self._barrier is not None
         self._semaphore.acquire()
         try:
             engine.run(*args, **kwargs)
@@ -752,7 +1091,7 @@ class Comparer:
         except threading.BrokenBarrierError:
             pass
         except Exception:
-            self._barrier.abort()
+            self._abort()
             raise
         finally:
             self._semaphore.release()
@@ -761,18 +1100,28 @@ class Comparer:
         """Compares outputs."""
         self._count = 0
         n_workers = len(self._engines)
-        self._barrier = threading.Barrier(n_workers)
+        self._generation_done = threading.Event()
+        self._broken = False
+        names = tuple(self._engines)
+        self._reference = names[0] if self._baseline is None else self._baseline
+        self._backends = tuple(n for n in names if n != self._reference)
         self._semaphore = threading.Semaphore(
             n_workers if self._concurrency is None else self._concurrency
         )
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=n_workers
-        ) as executor:
-            futures = []
-            for _, (engine, args, kwargs) in self._engines.items():
-                futures.append(executor.submit(self._run_engine, engine, args, kwargs))  # type: ignore[arg-type]
-            for future in concurrent.futures.as_completed(futures):
-                future.result()
+        # Worker threads are named so that profilers and stack dumps can
+        # tell them apart from the threads of the engines themselves
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=n_workers, thread_name_prefix="Comparer"
+            ) as executor:
+                futures = []
+                for engine, args, kwargs in self._engines.values():
+                    futures.append(executor.submit(self._run_engine, engine, args, kwargs))  # type: ignore[arg-type]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+        finally:
+            # Release the pinned memory, it is only reused within a run
+            self._host_buffers.clear()
 
 
 def intermediate_value(name: str, value: torch.Tensor) -> None:
@@ -299,6 +299,48 @@ def test_model_comparer_invalid():
         comp.compare({"cpu": train_1, "gpu": train_2})
 
 
+class ModelReassigningBuffer(torch.nn.Module):
+    def __init__(self, step):
+        super().__init__()
+        self.w = torch.nn.Parameter(torch.zeros(10))
+        self.register_buffer("total", torch.zeros(10))
+        self.step = step
+
+    def forward(self, x):
+        # Replaces the buffer instead of updating it in place
+        self.total = self.total + self.step
+        return {"y": (self.w * x).sum()}
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize("step,valid", [(1.0, True), (2.0, False)])
+def test_model_comparer_reassigned_buffer(step, valid):
+    model_cpu = ModelReassigningBuffer(1.0)
+    model_gpu = ModelReassigningBuffer(step)
+    ppe.to(model_cpu, "cpu")
+    ppe.to(model_gpu, "cuda:0")
+
+    optimizer_cpu = torch.optim.SGD(model_cpu.parameters(), lr=0.01)
+    trainer_cpu = ppe.engine.create_trainer(
+        model_cpu, optimizer_cpu, 1, device="cpu"
+    )
+    optimizer_gpu = torch.optim.SGD(model_gpu.parameters(), lr=0.01)
+    trainer_gpu = ppe.engine.create_trainer(
+        model_gpu, optimizer_gpu, 1, device="cuda:0"
+    )
+    comp = ppe.utils.comparer.ModelComparer(
+        {"cpu": trainer_cpu, "gpu": trainer_gpu}, to_compare_keys=["total"]
+    )
+
+    train_1 = list(torch.ones(10) for _ in range(10))
+    train_2 = list(torch.ones(10) for _ in range(10))
+    if valid:
+        comp.compare({"cpu": train_1, "gpu": train_2})
+    else:
+        with pytest.raises(AssertionError):
+            comp.compare({"cpu": train_1, "gpu": train_2})
+
+
 class ModelRetTuple(torch.nn.Module):
     def __init__(self, device, ret_val):
         super().__init__()
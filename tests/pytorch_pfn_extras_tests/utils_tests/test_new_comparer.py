@@ -1,3 +1,4 @@
+import re
 import tempfile
 import typing
 
@@ -129,6 +130,35 @@ class _CustomComparer:
             assert out_1.cpu() == out_2.cpu()
 
 
+class _DeviceCheckComparer:
+    def __init__(self, devices):
+        self.devices = devices
+        self.times_called = 0
+
+    def __call__(self, eng_name_1, eng_name_2, out_name, out_1, out_2):
+        if out_name == "output:a":
+            assert out_1.device == torch.device(self.devices[eng_name_1])
+            assert out_2.device == torch.device(self.devices[eng_name_2])
+            assert out_1.requires_grad and out_2.requires_grad
+            self.times_called += 1
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_evaluator, _get_trainer_with_evaluator]
+)
+def test_comparer_custom_fn_receives_engine_values(engine_fn):
+    loader = list(torch.ones(10) for _ in range(10))
+    engine_cpu, loaders_cpu = engine_fn(Model, "cpu", [1.0], loader)
+    engine_gpu, loaders_gpu = engine_fn(Model, "cuda:0", [1.0], loader)
+    compare_fn = _DeviceCheckComparer({"cpu": "cpu", "gpu": "cuda:0"})
+    comp = ppe.utils.comparer.Comparer(compare_fn=compare_fn)
+    comp.add_engine("cpu", engine_cpu, *loaders_cpu)
+    comp.add_engine("gpu", engine_gpu, *loaders_gpu)
+    comp.compare()
+    assert compare_fn.times_called > 0
+
+
 @pytest.mark.gpu
 @pytest.mark.parametrize(
     "engine_fn", [_get_trainer, _get_trainer_with_evaluator]
@@ -268,6 +298,104 @@ def test_model_comparer_invalid(engine_fn):
         comp.compare()
 
 
+class ModelAlternatingOutputs(torch.nn.Module):
+    def __init__(self, device, ret_val, first=False):
+        super().__init__()
+        self.w = torch.nn.Parameter(torch.zeros(10))
+        self.device = device
+        self.ret_val = ret_val
+        self.iter = 0 if first else 1
+
+    def forward(self, x):
+        self.iter += 1
+        outputs = {"a": torch.tensor(1.0, device=self.device)}
+        # "b" only appears in every other iteration
+        if self.iter % 2 == 1:
+            outputs["b"] = torch.tensor(self.ret_val, device=self.device)
+        return outputs
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_trainer_with_evaluator]
+)
+@pytest.mark.parametrize("ret_val,valid", [(1.0, True), (0.5, False)])
+def test_comparer_outputs_vary_between_iterations(engine_fn, ret_val, valid):
+    loader = list(torch.ones(10) for _ in range(10))
+    engine_cpu, loaders_cpu = engine_fn(
+        ModelAlternatingOutputs, "cpu", [1.0], loader
+    )
+    engine_gpu, loaders_gpu = engine_fn(
+        ModelAlternatingOutputs, "cuda:0", [ret_val], loader
+    )
+    comp = ppe.utils.comparer.Comparer(trigger=(1, "iteration"))
+    comp.add_engine("cpu", engine_cpu, *loaders_cpu)
+    comp.add_engine("gpu", engine_gpu, *loaders_gpu)
+    if valid:
+        comp.compare()
+    else:
+        with pytest.raises(AssertionError, match="'output:b'"):
+            comp.compare()
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_trainer_with_evaluator]
+)
+def test_comparer_selected_output_missing(engine_fn):
+    loader = list(torch.ones(10) for _ in range(10))
+    engine_cpu, loaders_cpu = engine_fn(
+        ModelAlternatingOutputs, "cpu", [1.0, True], loader
+    )
+    engine_gpu, loaders_gpu = engine_fn(
+        ModelAlternatingOutputs, "cuda:0", [1.0, True], loader
+    )
+    comp = ppe.utils.comparer.Comparer(trigger=(1, "iteration"), outputs=["b"])
+    comp.add_engine("cpu", engine_cpu, *loaders_cpu)
+    comp.add_engine("gpu", engine_gpu, *loaders_gpu)
+    with pytest.raises(ValueError, match="didnt find b"):
+        comp.compare()
+
+
+class ModelReassigningBuffer(torch.nn.Module):
+    def __init__(self, device, step):
+        super().__init__()
+        self.w = torch.nn.Parameter(torch.zeros(10))
+        self.register_buffer("total", torch.zeros(10))
+        self.device = device
+        self.step = step
+
+    def forward(self, x):
+        # Replaces the buffer instead of updating it in place
+        self.total = self.total + self.step
+        a = torch.tensor(1.0, device=self.device)
+        a.requires_grad = True
+        return {"a": a}
+
+
+@pytest.mark.gpu
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_evaluator, _get_trainer_with_evaluator]
+)
+@pytest.mark.parametrize("step,valid", [(1.0, True), (2.0, False)])
+def test_model_comparer_reassigned_buffer(engine_fn, step, valid):
+    loader = list(torch.ones(10) for _ in range(10))
+    engine_cpu, loaders_cpu = engine_fn(
+        ModelReassigningBuffer, "cpu", [1.0], loader
+    )
+    engine_gpu, loaders_gpu = engine_fn(
+        ModelReassigningBuffer, "cuda:0", [step], loader
+    )
+    comp = ppe.utils.comparer.Comparer(outputs=False, params=True)
+    comp.add_engine("cpu", engine_cpu, *loaders_cpu)
+    comp.add_engine("gpu", engine_gpu, *loaders_gpu)
+    if valid:
+        comp.compare()
+    else:
+        with pytest.raises(AssertionError):
+            comp.compare()
+
+
 class ModelRetTuple(torch.nn.Module):
     def __init__(self, device, ret_val):
         super().__init__()
@@ -579,6 +707,20 @@ def test_dump(engine_fn, model_class, params):
         comp.compare()
 
 
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_evaluator, _get_trainer_with_evaluator]
+)
+def test_dump_releases_handlers(engine_fn):
+    loader = list(torch.ones(10) for _ in range(10))
+    comp = ppe.utils.comparer.Comparer(outputs=["a"], params=True)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i in range(3):
+            engine, loaders = engine_fn(Model, "cpu", [1.0], loader)
+            comp.dump(engine, f"{tmpdir}/{i}", *loaders)
+    assert len(comp._output_names) == 0
+    assert len(comp._params) == 0
+
+
 @pytest.mark.gpu
 @pytest.mark.parametrize(
     "engine_fn", [_get_trainer, _get_evaluator, _get_trainer_with_evaluator]
@@ -626,3 +768,217 @@ def test_compare_baseline(engine_fn):
     comp.add_engine("cpu", engine_cpu, *loaders_cpu)
     comp.add_engine("gpu", engine_gpu, *loaders_gpu)
     comp.compare()
+
+
+class ModelShapeByMode(torch.nn.Module):
+    def __init__(self, device):
+        super().__init__()
+        self.w = torch.nn.Parameter(torch.zeros(10))
+        self.device = device
+
+    def forward(self, x):
+        n = 10 if self.training else 3
+        return {"a": torch.ones(n, device=self.device)}
+
+
+@pytest.mark.gpu
+def test_compare_reuses_host_buffers(monkeypatch):
+    buffers = []
+    to_host = ppe.utils.comparer._to_host
+
+    def recording_to_host(targets, host_buffers=None):
+        host_targets = to_host(targets, host_buffers)
+        buffers.append(host_targets["gpu"]["output:a"])
+        assert len(host_buffers) == 1
+        return host_targets
+
+    monkeypatch.setattr(ppe.utils.comparer, "_to_host", recording_to_host)
+    loader = list(torch.ones(10) for _ in range(10))
+    engine_cpu, loaders_cpu = _get_trainer_with_evaluator(
+        ModelShapeByMode, "cpu", [], loader, max_epochs=2
+    )
+    engine_gpu, loaders_gpu = _get_trainer_with_evaluator(
+        ModelShapeByMode, "cuda:0", [], loader, max_epochs=2
+    )
+    comp = ppe.utils.comparer.Comparer(
+        trigger=(1, "iteration"), outputs=True, params=False
+    )
+    comp.add_engine("cpu", engine_cpu, *loaders_cpu)
+    comp.add_engine("gpu", engine_gpu, *loaders_gpu)
+    comp.compare()
+    # Both the trainer and the evaluator outputs are staged, and each
+    # of them keeps its own pinned buffer
+    assert len(buffers) == 40
+    assert all(buf.is_pinned() for buf in buffers)
+    assert len({buf.data_ptr() for buf in buffers}) == 2
+    assert len(comp._host_buffers) == 0
+
+
+@pytest.mark.gpu
+def test_to_host_reuses_buffers():
+    host_buffers = {}
+
+    def to_host(n):
+        targets = {
+            "cpu": {"output:a": torch.zeros(n)},
+            "gpu": {"output:a": torch.ones(n, device="cuda:0")},
+        }
+        host_targets = ppe.utils.comparer._to_host(targets, host_buffers)
+        value = host_targets["gpu"]["output:a"]
+        assert value.is_pinned()
+        assert torch.equal(value, torch.ones(n))
+        return value.data_ptr()
+
+    ptr = to_host(10)
+    # Smaller values are copied to the same buffer
+    assert to_host(3) == ptr
+    assert to_host(10) == ptr
+    # Larger values replace the buffer
+    to_host(20)
+    assert len(host_buffers) == 1
+    assert host_buffers[("gpu", "output:a")].numel() == 20
+
+
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_evaluator, _get_trainer_with_evaluator]
+)
+def test_compare_single_engine(engine_fn):
+    loader = list(torch.ones(10) for _ in range(10))
+    engine_cpu, loaders_cpu = engine_fn(Model, "cpu", [1.0], loader)
+    compare_fn = _CustomComparer()
+    comp = ppe.utils.comparer.Comparer(compare_fn=compare_fn)
+    comp.add_engine("cpu", engine_cpu, *loaders_cpu)
+    comp.compare()
+    assert compare_fn.times_called == 0
+
+
+class _RecordingComparer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, eng_name_1, eng_name_2, out_name, out_1, out_2):
+        self.calls.append((eng_name_1, eng_name_2, out_name))
+
+
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_evaluator, _get_trainer_with_evaluator]
+)
+def test_compare_intermediates_only(engine_fn):
+    loader = torch.utils.data.DataLoader(
+        [(torch.rand(20), torch.rand(10)) for i in range(10)]
+    )
+    engine_1, loaders_1 = engine_fn(
+        ModelForIntermediateValue, "cpu", [10.0], loader, max_epochs=1
+    )
+    engine_2, loaders_2 = engine_fn(
+        ModelForIntermediateValue, "cpu", [10.0], loader, max_epochs=1
+    )
+    compare_fn = _RecordingComparer()
+    comp = ppe.utils.comparer.Comparer(
+        compare_fn=compare_fn, outputs=False, params=False
+    )
+    comp.add_engine("1", engine_1, *loaders_1)
+    comp.add_engine("2", engine_2, *loaders_2)
+    comp.compare()
+    assert len(compare_fn.calls) > 0
+    for _, _, out_name in compare_fn.calls:
+        assert out_name.startswith("intermedaite:")
+
+
+@pytest.mark.parametrize(
+    "engine_fn", [_get_trainer, _get_evaluator, _get_trainer_with_evaluator]
+)
+def test_compare_default_baseline(engine_fn):
+    loader = list(torch.ones(10) for _ in range(10))
+    compare_fn = _RecordingComparer()
+    comp = ppe.utils.comparer.Comparer(compare_fn=compare_fn)
+    # The names are not added in sorted order on purpose
+    for name in ("b", "a", "c"):
+        engine, loaders = engine_fn(Model, "cpu", [1.0], loader)
+        comp.add_engine(name, engine, *loaders)
+    comp.compare()
+    assert len(compare_fn.calls) > 0
+    assert {call[0] for call in compare_fn.calls} == {"b"}
+    assert {call[1] for call in compare_fn.calls} == {"a", "c"}
+
+
+def test_compare_intermediate_skipped_iterations():
+    loader = torch.utils.data.DataLoader(
+        [(torch.rand(20), torch.rand(10)) for i in range(10)]
+    )
+    engine_1, loaders_1 = _get_trainer(
+        ModelForIntermediateValue, "cpu", [10.0], loader, max_epochs=2
+    )
+    engine_2, loaders_2 = _get_trainer(
+        ModelForIntermediateValue, "cpu", [10.0], loader, max_epochs=2
+    )
+    compare_fn = _RecordingComparer()
+    comp = ppe.utils.comparer.Comparer(
+        compare_fn=compare_fn, trigger=(3, "iteration")
+    )
+    comp.add_engine("1", engine_1, *loaders_1)
+    comp.add_engine("2", engine_2, *loaders_2)
+    handlers = [engine_1.handler, engine_2.handler]
+    comp.compare()
+    assert len(compare_fn.calls) > 0
+    # The values of the iterations that did not fire the trigger must
+    # not be kept by the handlers
+    for handler in handlers:
+        assert handler._intermediate_values == {}
+        assert handler._intermediate_counts == {}
+
+
+@pytest.mark.parametrize(
+    "val1,val2,close",
+    [
+        (torch.ones(10), torch.ones(10), True),
+        (torch.ones(10), torch.ones(10) * 1.01, False),
+        (torch.ones(10).double(), torch.ones(10).double(), True),
+        (torch.ones(10), torch.ones(10).double(), False),
+        (torch.ones(10), torch.ones(5), False),
+        (torch.ones(10, dtype=torch.int64), torch.ones(10), False),
+        (torch.tensor([float("nan")]), torch.tensor([float("nan")]), True),
+        (torch.ones(10, requires_grad=True), torch.ones(10), True),
+        (3, 3, True),
+        (3, 4, False),
+    ],
+)
+def test_default_comparer(val1, val2, close):
+    compare_fn = ppe.utils.comparer.get_default_comparer()
+    if close:
+        compare_fn("a", "b", "output:a", val1, val2)
+    else:
+        with pytest.raises(AssertionError):
+            compare_fn("a", "b", "output:a", val1, val2)
+
+
+@pytest.mark.parametrize("numel", [1, 8192])
+def test_default_comparer_pair(numel):
+    compare_fn = ppe.utils.comparer.get_default_comparer()
+    target1 = {
+        "output:a": torch.zeros(numel),
+        "output:b": torch.ones(2, numel, dtype=torch.float64),
+        "output:c": torch.zeros(numel),
+        "output:d": 1,
+    }
+    target2 = dict(target1)
+    keys = sorted(target1.keys())
+    assert compare_fn._compare_pair("a", "b", keys, target1, target2) == ""
+
+    target2["output:c"] = torch.ones(numel)
+    err_msg = compare_fn._compare_pair("a", "b", keys, target1, target2)
+    assert "'output:c'" in err_msg
+    assert "'output:a'" not in err_msg
+    assert "'output:b'" not in err_msg
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ["model", "model.*", "model.0", "model\\.0", "model.[01].weight", "w$"],
+)
+@pytest.mark.parametrize(
+    "key", ["model.0.weight", "model.1.bias", "modelX0.weight", "w"]
+)
+def test_key_matcher(pattern, key):
+    match = ppe.utils.comparer._key_matcher(pattern)
+    assert match(key) == (re.match(pattern, key) is not None)